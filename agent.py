@@ -1,15 +1,184 @@
 """Agent loop for computer use interactions with Claude."""
 
-from anthropic import Anthropic
+import asyncio
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Union
+
+from anthropic import AsyncAnthropic
 
 from config import Config
 from tools.computer import ComputerTool
 
+# Oldest speculative screenshot, in seconds, that may stand in for a fresh one
+_PREFETCH_MAX_AGE = 1.5
+
+# System prompt for better guidance
+SYSTEM_PROMPT = """You are a computer use assistant that can control a macOS computer.
+When performing tasks:
+1. Always take a screenshot first to see the current state of the screen.
+2. After each action, take another screenshot to verify the result.
+3. Be precise with click coordinates - aim for the center of buttons and UI elements.
+4. If something doesn't work, try alternative approaches.
+5. Report your progress and any issues you encounter.
+"""
+
+# Seconds between status checks while a message batch is processing
+_BATCH_POLL_INTERVAL = 20
+
+
+def _split_tool_input(tool_input: dict) -> tuple[str, dict]:
+    """Split a computer tool input into its action and remaining parameters."""
+    action = tool_input.get("action", "")
+    action_params = {k: v for k, v in tool_input.items() if k != "action"}
+    return action, action_params
+
+
+class _UserQuit(Exception):
+    """Raised internally when the confirm callback asks to stop the run."""
+
+
+@contextmanager
+def _interruptible_prompt():
+    """
+    Let Ctrl+C raise KeyboardInterrupt during a blocking prompt.
+
+    Inside asyncio.run, SIGINT only cancels the main task, which a call blocked
+    in input() never notices until the user presses Enter. Python's default
+    handler is restored for the duration of the prompt.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    previous = signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+class _ScreenshotPrefetcher:
+    """
+    Speculatively captures the screen while Claude is generating.
+
+    The system prompt asks Claude to take a screenshot after every action, so
+    a turn usually starts with one. A capture is started in the background
+    when the first tool_use block of a response begins, while its input is
+    still streaming, and handed to the first screenshot call of that turn.
+    It is discarded if another action is submitted first, or if the turn ends
+    without claiming it.
+
+    The future resolves to (captured_at, result), where captured_at is the
+    time.monotonic() at which the capture began.
+    """
+
+    def __init__(self, computer: ComputerTool):
+        self.computer = computer
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._pending: Optional[Future] = None
+
+    def start(self) -> None:
+        """Start a background capture unless one is already pending."""
+        if self._pending is None:
+            self._pending = self._pool.submit(self._capture)
+
+    def invalidate(self) -> None:
+        """Discard the pending capture so the next start() captures afresh."""
+        self._pending = None
+
+    def take(self) -> Optional[Future]:
+        """Claim the pending capture, if there is one."""
+        pending, self._pending = self._pending, None
+        return pending
+
+    def _capture(self) -> tuple[float, dict]:
+        captured_at = time.monotonic()
+        return captured_at, self.computer.execute("screenshot")
+
+
+class ActionQueue:
+    """
+    Runs computer actions in worker threads without reordering their effects.
+
+    Consecutive read-only actions run concurrently. A mutating action waits for
+    everything submitted before it, and everything submitted after it waits for
+    the mutation to finish. Agents driving the same screen must share one
+    queue, so that one agent's screenshot is ordered after another's click.
+    """
+
+    def __init__(self, computer: ComputerTool):
+        self.computer = computer
+        self.prefetcher = _ScreenshotPrefetcher(computer)
+        self._last_mutation: list[asyncio.Task] = []
+        self._reads_since_mutation: list[asyncio.Task] = []
+
+    def prefetch(self) -> None:
+        """
+        Start a speculative screenshot, unless a mutation is still running.
+
+        A frame captured before another agent's click lands would be handed
+        to a screenshot queued after that click, so none is taken until the
+        mutation has finished.
+        """
+        if all(t.done() for t in self._last_mutation):
+            self.prefetcher.start()
+
+    def submit(self, action: str, params: dict) -> asyncio.Task:
+        """Schedule an action and return a task resolving to its result."""
+        # Finished tasks need no waiting on, and may belong to an event loop
+        # from an earlier run
+        last_mutation = [t for t in self._last_mutation if not t.done()]
+        reads = [t for t in self._reads_since_mutation if not t.done()]
+
+        if action in self.computer.READ_ONLY_ACTIONS:
+            prefetched = self.prefetcher.take() if action == "screenshot" else None
+            task = asyncio.create_task(
+                self._run(last_mutation, action, params, prefetched)
+            )
+            self._last_mutation = last_mutation
+            self._reads_since_mutation = reads + [task]
+        else:
+            self.prefetcher.invalidate()
+            task = asyncio.create_task(self._run(last_mutation + reads, action, params))
+            self._last_mutation = [task]
+            self._reads_since_mutation = []
+        return task
+
+    async def _run(
+        self,
+        wait_for: list[asyncio.Task],
+        action: str,
+        params: dict,
+        prefetched: Optional[Future] = None,
+    ) -> dict:
+        if wait_for:
+            await asyncio.gather(*wait_for, return_exceptions=True)
+        if prefetched is not None:
+            captured_at, result = await asyncio.wrap_future(prefetched)
+            # A frame that waited long for its screenshot call may be out of date
+            if time.monotonic() - captured_at <= _PREFETCH_MAX_AGE:
+                return result
+        return await asyncio.to_thread(self.computer.execute, action, **params)
+
 
 class ComputerUseAgent:
     """Agent that interacts with Claude API for computer use tasks."""
 
-    def __init__(self, config: Config, confirm_callback=None):
+    # Clients shared by agents created without an explicit client, keyed by
+    # API key. Built on first use rather than at import time.
+    _shared_clients: dict[str, AsyncAnthropic] = {}
+
+    def __init__(
+        self,
+        config: Config,
+        confirm_callback=None,
+        client: Optional[AsyncAnthropic] = None,
+        actions: Optional[ActionQueue] = None,
+    ):
         """
         Initialize the agent.
 
@@ -18,24 +187,78 @@ class ComputerUseAgent:
             confirm_callback: Optional callback function that receives action description
                               and returns True to execute, False to skip, or raises
                               StopIteration to quit.
+            client: Optional API client. Defaults to a client shared by all agents
+                    with the same API key, so they reuse one connection pool.
+            actions: Optional action queue, with the computer it drives. Agents
+                     running at the same time must share one. Defaults to a
+                     new queue over a new ComputerTool.
         """
         self.config = config
-        self.client = Anthropic(api_key=config.api_key)
-        self.computer = ComputerTool(config.display_width, config.display_height)
+        self.client = client if client is not None else self._get_shared_client(config.api_key)
+        if actions is None:
+            actions = ActionQueue(ComputerTool(config.display_width, config.display_height))
+        self.actions = actions
+        self.computer = actions.computer
+        self._prefetcher = actions.prefetcher
         self.confirm_callback = confirm_callback
         self.messages: list[dict] = []
-
-    def _get_tools(self) -> list[dict]:
-        """Get the tool definitions for the API request."""
-        return [
+        # Tool definitions for API requests; fixed for the agent's lifetime
+        self._tools = [
             {
-                "type": self.config.tool_version,
+                "type": config.tool_version,
                 "name": "computer",
-                "display_width_px": self.config.display_width,
-                "display_height_px": self.config.display_height,
+                "display_width_px": config.display_width,
+                "display_height_px": config.display_height,
             }
         ]
 
+    @classmethod
+    def _get_shared_client(cls, api_key: str) -> AsyncAnthropic:
+        """Get the shared client for an API key, creating it on first use."""
+        client = cls._shared_clients.get(api_key)
+        if client is None:
+            client = cls._shared_clients[api_key] = AsyncAnthropic(api_key=api_key)
+        return client
+
+    def _message_params(self, messages: list) -> dict:
+        """Build the request parameters shared by streaming and batch calls."""
+        return {
+            "model": self.config.model,
+            "max_tokens": self.config.max_tokens,
+            "system": SYSTEM_PROMPT,
+            "tools": self._tools,
+            "messages": messages,
+        }
+
+    def _elide_old_screenshots(self, messages: list[dict]) -> list[dict]:
+        """
+        Copy messages with all but the most recent screenshots replaced by a stub.
+
+        Every request resends the whole conversation, so old screenshots would
+        otherwise make upload size and context grow with each iteration. Only
+        the request payload is elided; the messages themselves are not modified,
+        so the conversation log keeps every screenshot.
+        """
+        kept = 0
+        elided = []
+        for message in reversed(messages):
+            if message["role"] == "user" and isinstance(message["content"], list):
+                content = []
+                for block in reversed(message["content"]):
+                    if (
+                        block.get("type") == "tool_result"
+                        and isinstance(block["content"], list)
+                        and any(part.get("type") == "image" for part in block["content"])
+                    ):
+                        if kept < self.config.screenshots_in_context:
+                            kept += 1
+                        else:
+                            block = {**block, "content": "[old screenshot elided]"}
+                    content.append(block)
+                message = {**message, "content": content[::-1]}
+            elided.append(message)
+        return elided[::-1]
+
     def _create_tool_result(self, tool_use_id: str, result: dict) -> dict:
         """Create a tool result message."""
         if "error" in result:
@@ -70,56 +293,100 @@ class ComputerUseAgent:
             "content": result.get("result", "Action completed"),
         }
 
-    def _process_tool_calls(self, response_content: list) -> list[dict]:
-        """Process tool calls from Claude's response."""
-        tool_results = []
+    def _start_tool_call(self, block) -> tuple[str, Union[dict, asyncio.Task]]:
+        """
+        Confirm a tool call and start it on the action queue.
 
-        for block in response_content:
-            if block.type != "tool_use":
-                continue
+        Returns the tool use id paired with either a finished tool result (for
+        unknown tools and skipped actions) or the task running the action.
+        Raises _UserQuit if the user wants to quit.
+        """
+        tool_name = block.name
+        tool_id = block.id
+
+        if tool_name != "computer":
+            return tool_id, {
+                "type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": f"Unknown tool: {tool_name}",
+                "is_error": True,
+            }
 
-            tool_name = block.name
-            tool_input = block.input
-            tool_id = block.id
+        action, action_params = _split_tool_input(block.input)
 
-            if tool_name != "computer":
-                tool_results.append({
+        # Get action description for logging/confirmation
+        action_desc = self.computer.describe_action(action, **action_params)
+
+        # Check for confirmation if callback provided
+        if self.confirm_callback and action != "screenshot":
+            try:
+                with _interruptible_prompt():
+                    should_execute = self.confirm_callback(action_desc)
+            except (StopIteration, KeyboardInterrupt):
+                # StopIteration can't propagate out of a coroutine, and Ctrl+C
+                # at the prompt means the same as answering "q"
+                raise _UserQuit from None
+            if not should_execute:
+                return tool_id, {
                     "type": "tool_result",
                     "tool_use_id": tool_id,
-                    "content": f"Unknown tool: {tool_name}",
-                    "is_error": True,
-                })
-                continue
-
-            action = tool_input.get("action", "")
-            action_params = {k: v for k, v in tool_input.items() if k != "action"}
+                    "content": "Action skipped by user",
+                }
 
-            # Get action description for logging/confirmation
-            action_desc = self.computer.describe_action(action, **action_params)
+        print(f"  Executing: {action_desc}")
+        return tool_id, self.actions.submit(action, action_params)
 
-            # Check for confirmation if callback provided
-            if self.confirm_callback and action != "screenshot":
+    async def _collect_tool_results(self, pending: list) -> list[dict]:
+        """Wait for started tool calls and build their tool result messages."""
+        tool_results = []
+        for tool_id, result in pending:
+            if isinstance(result, asyncio.Task):
                 try:
-                    should_execute = self.confirm_callback(action_desc)
-                    if not should_execute:
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_id,
-                            "content": "Action skipped by user",
-                        })
-                        continue
-                except StopIteration:
-                    # User wants to quit
-                    raise
-
-            # Execute the action
-            print(f"  Executing: {action_desc}")
-            result = self.computer.execute(action, **action_params)
-            tool_results.append(self._create_tool_result(tool_id, result))
-
+                    result = await result
+                except Exception as e:
+                    result = {"error": f"Action failed: {e}"}
+                result = self._create_tool_result(tool_id, result)
+            tool_results.append(result)
         return tool_results
 
-    def run(self, task: str) -> str:
+    def _handle_block(self, block, pending: list) -> None:
+        """Print a completed text block or start a completed tool_use block."""
+        if block.type == "text":
+            print(f"\nClaude: {block.text}")
+        elif block.type == "tool_use":
+            pending.append(self._start_tool_call(block))
+
+    async def _stream_response(self, pending: list):
+        """
+        Stream one response from Claude, starting each tool call as soon as
+        its tool_use block is complete.
+
+        The likely first screenshot is captured while the first tool_use
+        block streams in. Started calls are appended to ``pending``. Returns
+        the final message.
+        """
+        async with self.client.beta.messages.stream(
+            **self._message_params(self._elide_old_screenshots(self.messages)),
+            betas=[self.config.beta_flag],
+        ) as stream:
+            async for event in stream:
+                if (
+                    event.type == "content_block_start"
+                    and event.content_block.type == "tool_use"
+                    and not pending
+                ):
+                    self.actions.prefetch()
+                elif event.type == "content_block_stop":
+                    self._handle_block(event.content_block, pending)
+            return await stream.get_final_message()
+
+    def _replay_response(self, response, pending: list):
+        """Handle a response that was fetched ahead of time, e.g. by a batch."""
+        for block in response.content:
+            self._handle_block(block, pending)
+        return response
+
+    async def run(self, task: str) -> str:
         """
         Run the agent loop for a given task.
 
@@ -131,20 +398,74 @@ class ComputerUseAgent:
         """
         # Initialize messages with the user task
         self.messages = [{"role": "user", "content": task}]
+        return await self._run_loop(task)
 
-        # Add system prompt for better guidance
-        system_prompt = """You are a computer use assistant that can control a macOS computer.
-When performing tasks:
-1. Always take a screenshot first to see the current state of the screen.
-2. After each action, take another screenshot to verify the result.
-3. Be precise with click coordinates - aim for the center of buttons and UI elements.
-4. If something doesn't work, try alternative approaches.
-5. Report your progress and any issues you encounter.
-"""
+    async def run_batch(self, tasks: list[str]) -> list[str]:
+        """
+        Run several tasks, sending their first turn through the Message Batches API.
+
+        The opening request of every task goes out in a single batch, which is
+        billed at half price. Once the batch has ended, each task continues in
+        the regular loop, one after another since they share the screen.
+
+        Args:
+            tasks: The task descriptions for Claude to complete
+
+        Returns:
+            The final text response from Claude for each task
+        """
+        try:
+            batch = await self.client.beta.messages.batches.create(
+                requests=[
+                    {
+                        "custom_id": f"task-{i}",
+                        "params": self._message_params([{"role": "user", "content": task}]),
+                    }
+                    for i, task in enumerate(tasks)
+                ],
+                betas=[self.config.beta_flag],
+            )
+            print(f"Submitted batch {batch.id} with {len(tasks)} task(s)")
+
+            while batch.processing_status != "ended":
+                await asyncio.sleep(_BATCH_POLL_INTERVAL)
+                batch = await self.client.beta.messages.batches.retrieve(batch.id)
+                print(f"  Batch status: {batch.processing_status}")
+
+            results = {}
+            async for entry in await self.client.beta.messages.batches.results(batch.id):
+                results[entry.custom_id] = entry.result
+        except Exception as e:
+            print(f"API Error: {e}")
+            return [f"API Error: {e}"] * len(tasks)
+
+        final_responses = []
+        for i, task in enumerate(tasks):
+            result = results.get(f"task-{i}")
+            if result is None or result.type != "succeeded":
+                status = result.type if result is not None else "missing"
+                print(f"\nAPI Error: batch request for task {i} {status}")
+                final_responses.append(f"API Error: batch request {status}")
+                continue
 
+            self.messages = [{"role": "user", "content": task}]
+            final_responses.append(await self._run_loop(task, first_response=result.message))
+
+        return final_responses
+
+    async def _run_loop(self, task: str, first_response=None) -> str:
+        """
+        Drive the conversation in self.messages until Claude is done.
+
+        If first_response is given, it is used for the first iteration instead
+        of calling the API.
+        """
         iterations = 0
         final_response = ""
 
+        # Never hand this task a frame captured for an earlier one
+        self._prefetcher.invalidate()
+
         print(f"\nStarting agent with task: {task}")
         print(f"Screen dimensions: {self.config.display_width}x{self.config.display_height}")
         print("-" * 50)
@@ -153,27 +474,34 @@ When performing tasks:
             iterations += 1
             print(f"\n[Iteration {iterations}/{self.config.max_iterations}]")
 
-            # Call Claude API
+            # Get Claude's response (streamed, or replayed from a batch); tool
+            # calls start as blocks complete
+            pending: list = []
             try:
-                response = self.client.beta.messages.create(
-                    model=self.config.model,
-                    max_tokens=self.config.max_tokens,
-                    system=system_prompt,
-                    tools=self._get_tools(),
-                    messages=self.messages,
-                    betas=[self.config.beta_flag],
-                )
+                if first_response is not None:
+                    response = self._replay_response(first_response, pending)
+                    first_response = None
+                else:
+                    response = await self._stream_response(pending)
+            except _UserQuit:
+                await self._collect_tool_results(pending)
+                print("\n[User quit]")
+                break
             except Exception as e:
+                await self._collect_tool_results(pending)
                 print(f"API Error: {e}")
                 return f"API Error: {e}"
+            finally:
+                # Screenshots claim the capture while the response is handled;
+                # one left unclaimed would be stale by the next turn
+                self._prefetcher.invalidate()
 
             # Add assistant response to messages
             self.messages.append({"role": "assistant", "content": response.content})
 
-            # Print any text response
+            # Text blocks were printed while streaming
             for block in response.content:
-                if hasattr(block, "text"):
-                    print(f"\nClaude: {block.text}")
+                if block.type == "text":
                     final_response = block.text
 
             # Check if Claude is done (no tool use)
@@ -181,12 +509,7 @@ When performing tasks:
                 print("\n[Task completed]")
                 break
 
-            # Process tool calls
-            try:
-                tool_results = self._process_tool_calls(response.content)
-            except StopIteration:
-                print("\n[User quit]")
-                break
+            tool_results = await self._collect_tool_results(pending)
 
             if not tool_results:
                 print("\n[No more tool calls]")
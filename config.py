@@ -44,6 +44,8 @@ class Config:
     # Agent settings
     max_tokens: int = 4096
     max_iterations: int = 10
+    # Screenshots kept in the history sent to the API; older ones are elided
+    screenshots_in_context: int = 2
 
     # Safety settings
     confirm_actions: bool = True
@@ -2,10 +2,45 @@
 """CLI entry point for the computer-use MVP."""
 
 import argparse
+import asyncio
 import sys
+from functools import partial
+from typing import Callable
 
-from agent import ComputerUseAgent
+from agent import ActionQueue, ComputerUseAgent
 from config import get_config
+from tools.computer import ComputerTool
+
+# Limits for --tasks-file runs, to stay under Anthropic API rate limits
+MAX_CONCURRENCY = 3
+TASK_STAGGER = 0.15  # Seconds between task starts
+
+
+def load_tasks(path: str) -> list[str]:
+    """Read tasks from a file, one per line, ignoring blank lines."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+async def run_tasks(
+    make_agent: Callable[[], ComputerUseAgent], tasks: list[str], concurrency: int
+) -> list[str]:
+    """
+    Run tasks concurrently, at most `concurrency` at a time.
+
+    Each task gets its own agent and conversation. make_agent must give them
+    all the same action queue, since they drive the same screen. Even so, only
+    raise concurrency for tasks that won't interfere with each other.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index: int, task: str) -> str:
+        # Stagger starts so requests don't arrive in bursts
+        await asyncio.sleep(index * TASK_STAGGER)
+        async with semaphore:
+            return await make_agent().run(task)
+
+    return await asyncio.gather(*(bounded(i, task) for i, task in enumerate(tasks)))
 
 
 def confirm_action(action_desc: str) -> bool:
@@ -33,24 +68,28 @@ def interactive_mode(agent: ComputerUseAgent):
     print("\n=== Computer Use Agent - Interactive Mode ===")
     print("Enter tasks for Claude to perform. Type 'quit' or 'exit' to stop.\n")
 
-    while True:
-        try:
-            task = input("Task: ").strip()
-            if not task:
-                continue
-            if task.lower() in ("quit", "exit"):
-                print("Goodbye!")
+    # One event loop for the whole session keeps the async client's connection
+    # pool alive between tasks. The Task: prompt runs outside the loop so
+    # Ctrl+C interrupts it immediately.
+    with asyncio.Runner() as runner:
+        while True:
+            try:
+                task = input("Task: ").strip()
+                if not task:
+                    continue
+                if task.lower() in ("quit", "exit"):
+                    print("Goodbye!")
+                    break
+
+                runner.run(agent.run(task))
+                print("\n" + "=" * 50 + "\n")
+
+            except KeyboardInterrupt:
+                print("\n\nInterrupted. Goodbye!")
+                break
+            except EOFError:
+                print("\nGoodbye!")
                 break
-
-            agent.run(task)
-            print("\n" + "=" * 50 + "\n")
-
-        except KeyboardInterrupt:
-            print("\n\nInterrupted. Goodbye!")
-            break
-        except EOFError:
-            print("\nGoodbye!")
-            break
 
 
 def main():
@@ -63,6 +102,8 @@ Examples:
   python main.py "Open Safari and search for Claude AI"
   python main.py --interactive
   python main.py --no-confirm "Open TextEdit"
+  python main.py --batch tasks.txt
+  python main.py --no-confirm --tasks-file tasks.txt --concurrency 2
 
 Safety:
   By default, you'll be asked to confirm each action.
@@ -81,6 +122,26 @@ Safety:
         action="store_true",
         help="Run in interactive mode",
     )
+    task_source = parser.add_mutually_exclusive_group()
+    task_source.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="Run the tasks in FILE (one per line), sending their first turn "
+             "through the Message Batches API at half price",
+    )
+    task_source.add_argument(
+        "--tasks-file",
+        metavar="FILE",
+        help="Run the tasks in FILE (one per line), see --concurrency",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help=f"Tasks from --tasks-file to run at once, at most {MAX_CONCURRENCY} "
+             "(default: 1). Requires --no-confirm. All tasks share the screen, "
+             "so only use this for tasks that won't interfere with each other",
+    )
     parser.add_argument(
         "--no-confirm",
         action="store_true",
@@ -100,6 +161,12 @@ Safety:
     )
 
     args = parser.parse_args()
+    if not 1 <= args.concurrency <= MAX_CONCURRENCY:
+        parser.error(f"--concurrency must be between 1 and {MAX_CONCURRENCY}")
+    if args.concurrency > 1 and not args.tasks_file:
+        parser.error("--concurrency requires --tasks-file")
+    if args.concurrency > 1 and not args.no_confirm:
+        parser.error("--concurrency above 1 requires --no-confirm")
 
     # Get configuration
     try:
@@ -116,19 +183,41 @@ Safety:
     print(f"Model: {config.model}")
     print(f"Confirmations: {'disabled' if args.no_confirm else 'enabled'}")
 
-    # Create agent with optional confirmation callback
+    # Create agents with optional confirmation callback. They all share one
+    # computer and action queue, since there is only one screen.
     confirm_callback = confirm_action if not args.no_confirm else None
-    agent = ComputerUseAgent(config, confirm_callback=confirm_callback)
+    actions = ActionQueue(ComputerTool(config.display_width, config.display_height))
+    make_agent = partial(
+        ComputerUseAgent, config, confirm_callback=confirm_callback, actions=actions
+    )
+
+    tasks_path = args.batch or args.tasks_file
+    if tasks_path:
+        try:
+            tasks = load_tasks(tasks_path)
+        except OSError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if not tasks:
+            print(f"Error: no tasks found in {tasks_path}")
+            sys.exit(1)
 
     # Run in appropriate mode
-    if args.interactive or not args.task:
-        interactive_mode(agent)
+    if args.batch:
+        runner = make_agent().run_batch(tasks)
+    elif args.tasks_file:
+        runner = run_tasks(make_agent, tasks, args.concurrency)
+    elif args.interactive or not args.task:
+        interactive_mode(make_agent())
+        return
     else:
-        try:
-            agent.run(args.task)
-        except KeyboardInterrupt:
-            print("\n\nInterrupted. Goodbye!")
-            sys.exit(130)
+        runner = make_agent().run(args.task)
+
+    try:
+        asyncio.run(runner)
+    except KeyboardInterrupt:
+        print("\n\nInterrupted. Goodbye!")
+        sys.exit(130)
 
 
 if __name__ == "__main__":
@@ -1,31 +1,93 @@
 """Computer use tool implementation for macOS."""
 
-import base64
-import io
+import atexit
+import os
 import subprocess
 import tempfile
+import threading
 import time
 from pathlib import Path
 from typing import List, Optional, Tuple
 
+import cv2
+import numpy as np
 import pyautogui
-from PIL import Image
+import pybase64
+import Quartz
+import xxhash
+
+from . import macos_input
 
 # Configure pyautogui for safety
 pyautogui.FAILSAFE = True  # Move mouse to corner to abort
-pyautogui.PAUSE = 0.1  # Small pause between actions
+pyautogui.PAUSE = 0  # Pacing is handled per action, see _SETTLE_ACTIONS
+
+# Seconds to let macOS catch up after actions that switch focus or open UI
+# (e.g. cmd+tab, cmd+space)
+_SETTLE_DELAY = 0.05
+
+
+def _format_coordinate(params: dict, key: str = "coordinate") -> str:
+    coord = params.get(key, [0, 0])
+    return f"({coord[0]}, {coord[1]})"
+
+
+def _describe_type(params: dict) -> str:
+    text = params.get("text", "")
+    preview = text[:30] + "..." if len(text) > 30 else text
+    return f"Type: '{preview}'"
+
+
+# Human-readable action descriptions, keyed by action name
+_ACTION_DESCRIPTIONS = {
+    "screenshot": lambda p: "Take a screenshot",
+    "left_click": lambda p: f"Left click at {_format_coordinate(p)}",
+    "right_click": lambda p: f"Right click at {_format_coordinate(p)}",
+    "middle_click": lambda p: f"Middle click at {_format_coordinate(p)}",
+    "double_click": lambda p: f"Double click at {_format_coordinate(p)}",
+    "triple_click": lambda p: f"Triple click at {_format_coordinate(p)}",
+    "mouse_move": lambda p: f"Move mouse to {_format_coordinate(p)}",
+    "type": _describe_type,
+    "key": lambda p: f"Press key: {p.get('key', '')}",
+    "scroll": lambda p: f"Scroll {p.get('scroll_direction', 'down')} by {p.get('scroll_amount', 3)}",
+    "wait": lambda p: f"Wait {p.get('duration', 1.0)} seconds",
+    "left_click_drag": lambda p: (
+        f"Drag from {_format_coordinate(p, 'start_coordinate')} to {_format_coordinate(p)}"
+    ),
+}
 
 
 class ComputerTool:
     """Handles computer use actions on macOS."""
 
+    # Actions that only observe the screen and can safely run concurrently
+    READ_ONLY_ACTIONS = frozenset({"screenshot"})
+
+    # Actions followed by a short settle delay
+    _SETTLE_ACTIONS = frozenset({"key"})
+
     def __init__(self, display_width: int, display_height: int):
         self.display_width = display_width
         self.display_height = display_height
-
-    def execute(self, action: str, **params) -> dict:
-        """Execute a computer use action and return the result."""
-        action_handlers = {
+        # Pick JPEG quality up front from the frame size, in the spirit of
+        # Yelp's "JPEG dynamic quality", so one encode usually fits under the
+        # 4MB limit: up to 1080p-class (2.07MP) at 80, up to 1440p-class
+        # (3.69MP) at 70, anything larger at 60.
+        pixels = display_width * display_height
+        self._jpeg_quality = 80 if pixels <= 2_073_600 else 70 if pixels <= 3_686_400 else 60
+        self._jpeg_params = [int(cv2.IMWRITE_JPEG_QUALITY), self._jpeg_quality]
+        # (hash of resized frame, result dict) from the last screenshot
+        self._last_shot: Optional[Tuple[int, dict]] = None
+        # Capture file reused by every screenshot; the lock keeps overlapping
+        # screenshots from clobbering each other's capture
+        self._shot_path = str(
+            Path(tempfile.gettempdir()) / f"agent_shot_{os.getpid()}_{id(self)}.bmp"
+        )
+        self._shot_lock = threading.Lock()
+        atexit.register(Path(self._shot_path).unlink, missing_ok=True)
+
+        # Action dispatch table
+        self._handlers = {
             "screenshot": self._screenshot,
             "left_click": self._left_click,
             "right_click": self._right_click,
@@ -40,70 +102,149 @@ class ComputerTool:
             "wait": self._wait,
         }
 
-        handler = action_handlers.get(action)
+    def execute(self, action: str, **params) -> dict:
+        """Execute a computer use action and return the result."""
+        handler = self._handlers.get(action)
         if not handler:
             return {"error": f"Unknown action: {action}"}
 
         try:
-            return handler(**params)
+            if action not in self.READ_ONLY_ACTIONS:
+                # Mouse input goes straight to Quartz and bypasses pyautogui,
+                # so run its corner failsafe here
+                pyautogui.failSafeCheck()
+            result = handler(**params)
         except Exception as e:
             return {"error": f"Action '{action}' failed: {str(e)}"}
 
-    def _validate_coordinates(self, x: int, y: int) -> Tuple[bool, Optional[str]]:
-        """Validate that coordinates are within display bounds."""
-        if not (0 <= x < self.display_width):
-            return False, f"X coordinate {x} is outside display bounds (0-{self.display_width - 1})"
-        if not (0 <= y < self.display_height):
-            return False, f"Y coordinate {y} is outside display bounds (0-{self.display_height - 1})"
-        return True, None
-
-    def _screenshot(self, **_) -> dict:
-        """Capture a screenshot and return it as base64-encoded JPEG."""
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-            tmp_path = tmp.name
-
-        try:
-            # Use macOS screencapture command
+        if action in self._SETTLE_ACTIONS:
+            time.sleep(_SETTLE_DELAY)
+        return result
+
+    def _move_to(self, x: int, y: int) -> None:
+        """Move the mouse to (x, y) unless it is already within a couple of pixels."""
+        current_x, current_y = macos_input.position()
+        if abs(current_x - x) > 2 or abs(current_y - y) > 2:
+            macos_input.move(x, y)
+
+    def _capture_in_process(self) -> Optional[np.ndarray]:
+        """
+        Capture the main display without spawning screencapture.
+
+        The cursor is not part of the window list, so it is not in the frame.
+
+        Returns the frame as a BGRA array, or None if CGWindowListCreateImage
+        is unavailable or produced an unexpected pixel format.
+        """
+        create_image = getattr(Quartz, "CGWindowListCreateImage", None)
+        if create_image is None:
+            return None
+
+        image = create_image(
+            Quartz.CGDisplayBounds(Quartz.CGMainDisplayID()),
+            Quartz.kCGWindowListOptionOnScreenOnly,
+            Quartz.kCGNullWindowID,
+            Quartz.kCGWindowImageDefault,
+        )
+        if image is None or not self._is_bgra(image):
+            return None
+
+        width = Quartz.CGImageGetWidth(image)
+        height = Quartz.CGImageGetHeight(image)
+        bytes_per_row = Quartz.CGImageGetBytesPerRow(image)
+        data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image))
+
+        # Rows may be padded past width * 4 bytes; slice the padding off
+        # without copying. Pixels are little-endian ARGB, i.e. BGRA in memory.
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, bytes_per_row)
+        return pixels[:, : width * 4].reshape(height, width, 4)
+
+    @staticmethod
+    def _is_bgra(image) -> bool:
+        """Check that a CGImage's pixels are laid out as B, G, R, A bytes."""
+        if Quartz.CGImageGetBitsPerPixel(image) != 32:
+            return False
+        info = Quartz.CGImageGetBitmapInfo(image)
+        byte_order = info & Quartz.kCGBitmapByteOrderMask
+        alpha_info = info & Quartz.kCGBitmapAlphaInfoMask
+        # A little-endian 32-bit ARGB/XRGB word is B, G, R, A in memory
+        return byte_order == Quartz.kCGBitmapByteOrder32Little and alpha_info in (
+            Quartz.kCGImageAlphaPremultipliedFirst,
+            Quartz.kCGImageAlphaFirst,
+            Quartz.kCGImageAlphaNoneSkipFirst,
+        )
+
+    def _capture_with_screencapture(self) -> Optional[np.ndarray]:
+        """Capture the screen via the screencapture command, as a BGR array."""
+        with self._shot_lock:
+            # Uncompressed BMP skips the PNG deflate on capture and the
+            # inflate on load. No -C: the cursor is left out, as it is by
+            # the in-process capture, so frames look the same either way.
             result = subprocess.run(
-                ["screencapture", "-x", "-C", tmp_path],
+                ["screencapture", "-x", "-t", "bmp", self._shot_path],
                 capture_output=True,
                 timeout=10,
             )
 
             if result.returncode != 0:
-                return {"error": f"Screenshot failed: {result.stderr.decode()}"}
-
-            # Open with Pillow and resize to configured dimensions
-            # (Retina displays capture at 2x resolution)
-            img = Image.open(tmp_path)
-            img = img.resize(
-                (self.display_width, self.display_height),
-                Image.Resampling.LANCZOS
-            )
-
-            # Convert to RGB (JPEG doesn't support alpha channel)
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-
-            # Save as JPEG with compression
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=80, optimize=True)
-
-            # If still too large (>4MB), reduce quality
-            if buffer.tell() > 4_000_000:
-                buffer = io.BytesIO()
-                img.save(buffer, format="JPEG", quality=60, optimize=True)
+                raise RuntimeError(result.stderr.decode())
 
-            base64_image = base64.standard_b64encode(buffer.getvalue()).decode("utf-8")
+            return cv2.imread(self._shot_path, cv2.IMREAD_COLOR)
 
-            return {
-                "type": "image",
-                "media_type": "image/jpeg",
-                "data": base64_image,
-            }
-        finally:
-            # Clean up temp file
-            Path(tmp_path).unlink(missing_ok=True)
+    def _screenshot(self, **_) -> dict:
+        """Capture a screenshot and return it as base64-encoded JPEG."""
+        img = self._capture_in_process()
+        if img is None:
+            try:
+                img = self._capture_with_screencapture()
+            except RuntimeError as e:
+                return {"error": f"Screenshot failed: {e}"}
+
+        if img is None:
+            return {"error": "Screenshot failed: could not read captured image"}
+
+        # Resize to configured dimensions. Retina displays capture at exactly
+        # 2x, which pyrDown halves in one vectorized pass; other ratios fall
+        # back to an area-averaging resize.
+        src_height, src_width = img.shape[:2]
+        target = (self.display_width, self.display_height)
+        if (src_width, src_height) == (2 * self.display_width, 2 * self.display_height):
+            img = cv2.pyrDown(img, dstsize=target)
+        elif (src_width, src_height) != target:
+            img = cv2.resize(img, target, interpolation=cv2.INTER_AREA)
+
+        # JPEG has no alpha channel; dropping it after the resize touches a
+        # quarter of the pixels on Retina displays
+        if img.shape[2] == 4:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+
+        # Reuse the previous payload if the screen hasn't changed
+        frame_hash = xxhash.xxh3_64_intdigest(img)
+        last_shot = self._last_shot
+        if last_shot is not None and last_shot[0] == frame_hash:
+            return last_shot[1]
+
+        # Encode as JPEG
+        ok, buf = cv2.imencode(".jpg", img, self._jpeg_params)
+
+        # If still too large (>4MB), reduce quality
+        if ok and buf.nbytes > 4_000_000 and self._jpeg_quality > 60:
+            ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
+
+        if not ok:
+            return {"error": "Screenshot failed: JPEG encoding failed"}
+
+        # imencode's output array supports the buffer protocol, so it can be
+        # encoded in place without copying it into a bytes object first
+        base64_image = pybase64.b64encode_as_string(buf)
+
+        shot = {
+            "type": "image",
+            "media_type": "image/jpeg",
+            "data": base64_image,
+        }
+        self._last_shot = (frame_hash, shot)
+        return shot
 
     def _left_click(self, coordinate: Optional[List[int]] = None, **_) -> dict:
         """Perform a left click at the specified coordinates."""
@@ -111,11 +252,13 @@ class ComputerTool:
             return {"error": "coordinate is required for left_click"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.click(x, y, button="left")
+        macos_input.click(x, y, "left")
         return {"result": f"Left clicked at ({x}, {y})"}
 
     def _right_click(self, coordinate: Optional[List[int]] = None, **_) -> dict:
@@ -124,11 +267,13 @@ class ComputerTool:
             return {"error": "coordinate is required for right_click"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.click(x, y, button="right")
+        macos_input.click(x, y, "right")
         return {"result": f"Right clicked at ({x}, {y})"}
 
     def _middle_click(self, coordinate: Optional[List[int]] = None, **_) -> dict:
@@ -137,11 +282,13 @@ class ComputerTool:
             return {"error": "coordinate is required for middle_click"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.click(x, y, button="middle")
+        macos_input.click(x, y, "middle")
         return {"result": f"Middle clicked at ({x}, {y})"}
 
     def _double_click(self, coordinate: Optional[List[int]] = None, **_) -> dict:
@@ -150,11 +297,13 @@ class ComputerTool:
             return {"error": "coordinate is required for double_click"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.doubleClick(x, y)
+        macos_input.click(x, y, "left", clicks=2)
         return {"result": f"Double clicked at ({x}, {y})"}
 
     def _triple_click(self, coordinate: Optional[List[int]] = None, **_) -> dict:
@@ -163,11 +312,13 @@ class ComputerTool:
             return {"error": "coordinate is required for triple_click"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.tripleClick(x, y)
+        macos_input.click(x, y, "left", clicks=3)
         return {"result": f"Triple clicked at ({x}, {y})"}
 
     def _left_click_drag(
@@ -183,16 +334,22 @@ class ComputerTool:
         start_x, start_y = start_coordinate
         end_x, end_y = coordinate
 
-        valid, error = self._validate_coordinates(start_x, start_y)
-        if not valid:
-            return {"error": f"Start {error}"}
+        if not (0 <= start_x < self.display_width and 0 <= start_y < self.display_height):
+            return {
+                "error": f"Start coordinate ({start_x}, {start_y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        valid, error = self._validate_coordinates(end_x, end_y)
-        if not valid:
-            return {"error": f"End {error}"}
+        if not (0 <= end_x < self.display_width and 0 <= end_y < self.display_height):
+            return {
+                "error": f"End coordinate ({end_x}, {end_y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.moveTo(start_x, start_y)
-        pyautogui.drag(end_x - start_x, end_y - start_y, duration=0.5)
+        # Always move, even when close: the press lands where the pointer is, and
+        # a drag started a pixel or two off can grab the wrong edge or handle
+        macos_input.move(start_x, start_y)
+        pyautogui.dragTo(end_x, end_y, duration=0.5, button="left")
         return {"result": f"Dragged from ({start_x}, {start_y}) to ({end_x}, {end_y})"}
 
     def _mouse_move(self, coordinate: Optional[List[int]] = None, **_) -> dict:
@@ -201,11 +358,13 @@ class ComputerTool:
             return {"error": "coordinate is required for mouse_move"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
-        pyautogui.moveTo(x, y)
+        macos_input.move(x, y)
         return {"result": f"Moved mouse to ({x}, {y})"}
 
     def _type_text(self, text: Optional[str] = None, **_) -> dict:
@@ -248,22 +407,24 @@ class ComputerTool:
             return {"error": "scroll_direction is required for scroll"}
 
         x, y = coordinate
-        valid, error = self._validate_coordinates(x, y)
-        if not valid:
-            return {"error": error}
+        if not (0 <= x < self.display_width and 0 <= y < self.display_height):
+            return {
+                "error": f"Coordinate ({x}, {y}) is outside display bounds "
+                         f"({self.display_width}x{self.display_height})"
+            }
 
         # Move to position first
-        pyautogui.moveTo(x, y)
+        self._move_to(x, y)
 
         # Determine scroll direction
         if scroll_direction == "up":
-            pyautogui.scroll(scroll_amount)
+            macos_input.scroll(vertical=scroll_amount)
         elif scroll_direction == "down":
-            pyautogui.scroll(-scroll_amount)
+            macos_input.scroll(vertical=-scroll_amount)
         elif scroll_direction == "left":
-            pyautogui.hscroll(-scroll_amount)
+            macos_input.scroll(horizontal=-scroll_amount)
         elif scroll_direction == "right":
-            pyautogui.hscroll(scroll_amount)
+            macos_input.scroll(horizontal=scroll_amount)
         else:
             return {"error": f"Invalid scroll direction: {scroll_direction}"}
 
@@ -276,35 +437,7 @@ class ComputerTool:
 
     def describe_action(self, action: str, **params) -> str:
         """Get a human-readable description of an action."""
-        if action == "screenshot":
-            return "Take a screenshot"
-        elif action == "left_click":
-            coord = params.get("coordinate", [0, 0])
-            return f"Left click at ({coord[0]}, {coord[1]})"
-        elif action == "right_click":
-            coord = params.get("coordinate", [0, 0])
-            return f"Right click at ({coord[0]}, {coord[1]})"
-        elif action == "double_click":
-            coord = params.get("coordinate", [0, 0])
-            return f"Double click at ({coord[0]}, {coord[1]})"
-        elif action == "mouse_move":
-            coord = params.get("coordinate", [0, 0])
-            return f"Move mouse to ({coord[0]}, {coord[1]})"
-        elif action == "type":
-            text = params.get("text", "")
-            preview = text[:30] + "..." if len(text) > 30 else text
-            return f"Type: '{preview}'"
-        elif action == "key":
-            return f"Press key: {params.get('key', '')}"
-        elif action == "scroll":
-            direction = params.get("scroll_direction", "down")
-            amount = params.get("scroll_amount", 3)
-            return f"Scroll {direction} by {amount}"
-        elif action == "wait":
-            return f"Wait {params.get('duration', 1.0)} seconds"
-        elif action == "left_click_drag":
-            start = params.get("start_coordinate", [0, 0])
-            end = params.get("coordinate", [0, 0])
-            return f"Drag from ({start[0]}, {start[1]}) to ({end[0]}, {end[1]})"
-        else:
+        describe = _ACTION_DESCRIPTIONS.get(action)
+        if describe is None:
             return f"Unknown action: {action}"
+        return describe(params)
@@ -0,0 +1,59 @@
+"""Native macOS mouse input using CoreGraphics (Quartz) events."""
+
+from typing import Tuple
+
+import Quartz
+
+# Event types and button id for each mouse button: (down, up, button)
+_BUTTONS = {
+    "left": (Quartz.kCGEventLeftMouseDown, Quartz.kCGEventLeftMouseUp, Quartz.kCGMouseButtonLeft),
+    "right": (Quartz.kCGEventRightMouseDown, Quartz.kCGEventRightMouseUp, Quartz.kCGMouseButtonRight),
+    "middle": (Quartz.kCGEventOtherMouseDown, Quartz.kCGEventOtherMouseUp, Quartz.kCGMouseButtonCenter),
+}
+
+
+def _post(event) -> None:
+    Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+
+
+def position() -> Tuple[int, int]:
+    """Get the current pointer position in display points."""
+    location = Quartz.CGEventGetLocation(Quartz.CGEventCreate(None))
+    return int(location.x), int(location.y)
+
+
+def move(x: int, y: int) -> None:
+    """Move the pointer to (x, y)."""
+    _post(Quartz.CGEventCreateMouseEvent(
+        None, Quartz.kCGEventMouseMoved, (x, y), Quartz.kCGMouseButtonLeft
+    ))
+
+
+def click(x: int, y: int, button: str = "left", clicks: int = 1) -> None:
+    """
+    Click a mouse button at (x, y).
+
+    Each press carries its click count, so clicks=2 or 3 is seen by apps as a
+    double or triple click rather than separate single clicks.
+    """
+    down_type, up_type, button_id = _BUTTONS[button]
+    move(x, y)
+    for click_state in range(1, clicks + 1):
+        for event_type in (down_type, up_type):
+            event = Quartz.CGEventCreateMouseEvent(None, event_type, (x, y), button_id)
+            Quartz.CGEventSetIntegerValueField(
+                event, Quartz.kCGMouseEventClickState, click_state
+            )
+            _post(event)
+
+
+def scroll(vertical: int = 0, horizontal: int = 0) -> None:
+    """
+    Scroll by whole lines at the current pointer position.
+
+    Positive vertical scrolls up and positive horizontal scrolls right,
+    matching pyautogui.scroll and pyautogui.hscroll.
+    """
+    _post(Quartz.CGEventCreateScrollWheelEvent(
+        None, Quartz.kCGScrollEventUnitLine, 2, vertical, horizontal
+    ))